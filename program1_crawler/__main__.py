@@ -1,5 +1,5 @@
 """Module executed when running ``python -m program1_crawler``."""
-from .tdcc_crawler import run
+from .tdcc_crawler import main
 
 if __name__ == "__main__":  # pragma: no cover - manual execution
-    run()
+    main()
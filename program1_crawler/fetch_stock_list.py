@@ -3,10 +3,15 @@ from __future__ import annotations
 
 import logging
 import re
+import time
+from pathlib import Path
 from typing import Iterable, List, Tuple
 
+import lxml.html
+import orjson
 import requests
-from bs4 import BeautifulSoup
+
+from .utils import save_json
 
 # URL hosting the table with all Taiwanese stock codes
 MONEYDJ_STOCK_TABLE = "https://moneydj.emega.com.tw/js/StockTable.htm"
@@ -15,6 +20,12 @@ MONEYDJ_STOCK_TABLE = "https://moneydj.emega.com.tw/js/StockTable.htm"
 # and other non-equity instruments. The list can be extended over time.
 EXCLUDE_KEYWORDS = ["ETF", "債", "受益", "購", "權證"]
 
+_CODE_RE = re.compile(r"\d{4}")
+
+# The MoneyDJ list changes at most weekly, so a local copy is reused for a while.
+STOCK_CODES_CACHE = Path("stock_codes.json")
+STOCK_CODES_TTL_DAYS = 7
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,14 +44,14 @@ def fetch_stock_table(url: str = MONEYDJ_STOCK_TABLE) -> str:
 def parse_stock_codes(html: str) -> List[Tuple[str, str]]:
     """Parse the MoneyDJ table and return a list of (code, name) tuples.
 
-    The file mixes HTML and JavaScript; the approach here is to let BeautifulSoup
-    extract table rows and then use regular expressions for additional safety.
+    The rows are walked with :mod:`lxml.html`; a row is accepted when its first
+    cell is a four digit code, and the second cell is taken as the name.
     """
-    soup = BeautifulSoup(html, "lxml")
+    doc = lxml.html.fromstring(html)
     codes: List[Tuple[str, str]] = []
-    for row in soup.find_all("tr"):
-        cols = [c.get_text(strip=True) for c in row.find_all("td")]
-        if len(cols) >= 2 and re.fullmatch(r"\d{4}", cols[0]):
+    for row in doc.iter("tr"):
+        cols = [c.text_content().strip() for c in row.findall("td")]
+        if len(cols) >= 2 and _CODE_RE.fullmatch(cols[0]):
             codes.append((cols[0], cols[1]))
     return codes
 
@@ -60,13 +71,48 @@ def filter_stock_codes(codes: Iterable[Tuple[str, str]]) -> List[str]:
 
 
 def get_stock_codes() -> List[str]:
-    """Convenience function combining fetch, parse and filter steps."""
+    """Convenience function combining fetch, parse and filter steps.
+
+    Codes listed more than once on the page are dropped in a single pass that
+    keeps the first-seen order.
+    """
     html = fetch_stock_table()
     codes = parse_stock_codes(html)
-    return filter_stock_codes(codes)
+    return list(dict.fromkeys(filter_stock_codes(codes)))
+
+
+def load_stock_codes_cached(
+    path: str | Path = STOCK_CODES_CACHE,
+    ttl_days: float = STOCK_CODES_TTL_DAYS,
+    refresh: bool = False,
+) -> List[str]:
+    """Return the filtered stock codes, reusing *path* while it is fresh.
+
+    The cache is considered valid when its modification time is less than
+    *ttl_days* old. Otherwise (or when *refresh* is set) MoneyDJ is queried via
+    :func:`get_stock_codes` and the result is written back together with the
+    fetch timestamp.
+    """
+    cache = Path(path)
+    if not refresh:
+        try:
+            age = time.time() - cache.stat().st_mtime
+            if age < ttl_days * 86400:
+                codes = orjson.loads(cache.read_bytes())["codes"]
+                logger.debug("Using cached stock codes from %s", cache)
+                return codes
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    codes = get_stock_codes()
+    if codes:
+        save_json(cache, {"fetched_at": time.time(), "codes": codes}, ensure_dir=True)
+    return codes
+
 
 __all__ = [
     "get_stock_codes",
+    "load_stock_codes_cached",
     "fetch_stock_table",
     "parse_stock_codes",
     "filter_stock_codes",
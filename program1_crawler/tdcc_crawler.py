@@ -1,36 +1,57 @@
 """Crawler for fetching stock holding distribution data from TDCC."""
 from __future__ import annotations
 
+import argparse
 import datetime as _dt
 import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Set, Tuple
+
+import orjson
 
 from . import fetch_stock_list
-from .utils import request_with_retry, save_json
+from .utils import RateLimiter, request_with_retry, save_json
 
 TDCC_URL = "https://www.tdcc.com.tw/smWeb/QryStockAjax.do"
+# Snapshot file names written by :func:`download_date`: ``YYYYMMDD.json[.gz]``.
+_SNAPSHOT_RE = re.compile(r"(\d{8})\.json(?:\.gz)?")
 logger = logging.getLogger(__name__)
 
 
-def generate_past_year_dates(today: _dt.date | None = None) -> List[str]:
-    """Return a list of date strings (YYYYMMDD) for the past 52 weeks."""
-    if today is None:
-        today = _dt.date.today()
+@lru_cache(maxsize=4)
+def _past_year_dates(today: _dt.date) -> Tuple[str, ...]:
+    """Build the weekly date strings ending at *today*; cached per day."""
     start = today - _dt.timedelta(days=365)
     dates = []
     current = start
     while current <= today:
         dates.append(current.strftime("%Y%m%d"))
         current += _dt.timedelta(days=7)
-    return dates
+    return tuple(dates)
+
+
+def generate_past_year_dates(today: _dt.date | None = None) -> List[str]:
+    """Return a list of date strings (YYYYMMDD) for the past 52 weeks.
 
+    The list only depends on *today*, so it is computed once per day and reused
+    for every stock.
+    """
+    if today is None:
+        today = _dt.date.today()
+    return list(_past_year_dates(today))
 
-def fetch_tdcc_data(stock_code: str, date: str) -> Dict:
+
+def fetch_tdcc_data(stock_code: str, date: str, limiter: RateLimiter | None = None) -> Dict:
     """Fetch TDCC holding distribution for *stock_code* at *date*.
 
     The returned JSON structure mirrors what the website provides. Actual keys may
-    vary and callers should be prepared to handle changes.
+    vary and callers should be prepared to handle changes. The buffered body is
+    decoded with :mod:`orjson`, which parses bytes directly. When a shared
+    *limiter* is given it is acquired before every attempt, retries included.
     """
     payload = {
         "scaDates": date,
@@ -38,8 +59,81 @@ def fetch_tdcc_data(stock_code: str, date: str) -> Dict:
         "stkNo": stock_code,
     }
     logger.debug("Fetching TDCC data for %s at %s", stock_code, date)
-    resp = request_with_retry("post", TDCC_URL, data=payload)
-    return resp.json()
+    resp = request_with_retry("post", TDCC_URL, limiter=limiter, data=payload)
+    return orjson.loads(resp.content)
+
+
+def _stored_dates(stock_dir: str | Path) -> Set[str]:
+    """Return the snapshot dates saved in *stock_dir* (empty if it is missing).
+
+    Both plain ``.json`` and gzipped ``.json.gz`` snapshots are recognised; each
+    name is checked with a single match of a precompiled pattern, which also
+    skips stray ``.tmp`` files and anything not named after a date.
+    """
+    dates: Set[str] = set()
+    try:
+        with os.scandir(stock_dir) as files:
+            for f in files:
+                m = _SNAPSHOT_RE.fullmatch(f.name)
+                if m and f.is_file():
+                    dates.add(m.group(1))
+    except FileNotFoundError:
+        pass
+    return dates
+
+
+def scan_existing(base_dir: Path = Path("data")) -> Dict[str, Set[str]]:
+    """Map every stock directory under *base_dir* to its stored snapshot dates.
+
+    The whole tree is indexed in one walk with :func:`os.scandir`, whose entries
+    carry the name and file type without an extra ``stat`` per file.
+    """
+    index: Dict[str, Set[str]] = {}
+    try:
+        with os.scandir(base_dir) as stocks:
+            for stock in stocks:
+                if stock.is_dir():
+                    index[stock.name] = _stored_dates(stock.path)
+    except FileNotFoundError:
+        pass
+    return index
+
+
+def pending_dates(
+    stock_code: str,
+    base_dir: Path = Path("data"),
+    existing: Set[str] | None = None,
+) -> List[str]:
+    """Return the target dates not yet stored locally for *stock_code*.
+
+    *existing* may be supplied from :func:`scan_existing` to skip listing the
+    stock directory again.
+    """
+    if existing is None:
+        existing = _stored_dates(base_dir / stock_code)
+    return [d for d in generate_past_year_dates() if d not in existing]
+
+
+def download_date(
+    stock_code: str,
+    date: str,
+    base_dir: Path = Path("data"),
+    compress: bool = False,
+    limiter: RateLimiter | None = None,
+) -> bool:
+    """Fetch and store the snapshot of *stock_code* at *date*.
+
+    With *compress* the snapshot is written as ``<date>.json.gz``. Returns
+    ``True`` when the snapshot was saved and ``False`` when the fetch failed.
+    """
+    try:
+        data = fetch_tdcc_data(stock_code, date, limiter)
+    except Exception as exc:  # pragma: no cover - network dependent
+        logger.error("Failed to fetch %s %s: %s", stock_code, date, exc)
+        return False
+    # The stock directory is created by the caller before the downloads start.
+    save_json(base_dir / stock_code / f"{date}.json", data, compress=compress)
+    return True
 
 
 def update_stock(stock_code: str, base_dir: Path = Path("data")) -> List[str]:
@@ -47,34 +141,98 @@ def update_stock(stock_code: str, base_dir: Path = Path("data")) -> List[str]:
 
     Returns a list of dates that were downloaded during this invocation.
     """
-    stock_dir = base_dir / stock_code
-    existing = {p.stem for p in stock_dir.glob("*.json")}
-
-    target_dates = generate_past_year_dates()
-    new_dates = [d for d in target_dates if d not in existing]
-    downloaded: List[str] = []
-    for date in new_dates:
-        try:
-            data = fetch_tdcc_data(stock_code, date)
-        except Exception as exc:  # pragma: no cover - network dependent
-            logger.error("Failed to fetch %s %s: %s", stock_code, date, exc)
-            continue
-        save_json(stock_dir / f"{date}.json", data)
-        downloaded.append(date)
-    return downloaded
-
-
-def run() -> None:
-    """Entry point that fetches stock codes and updates them one by one."""
+    dates = pending_dates(stock_code, base_dir)
+    if dates:
+        (base_dir / stock_code).mkdir(parents=True, exist_ok=True)
+    return [date for date in dates if download_date(stock_code, date, base_dir)]
+
+
+def run(
+    max_workers: int = 8,
+    refresh_codes: bool = False,
+    compress: bool = False,
+    rate: int = 10,
+) -> None:
+    """Entry point that fetches stock codes and downloads their missing snapshots.
+
+    Every missing (stock, date) pair is an independent request, so all of them
+    are queued on one pool of *max_workers* threads instead of serialising the
+    dates of each stock behind a single worker. The stock list is read from the
+    local cache unless *refresh_codes* is set; *compress* stores gzipped snapshots.
+    All workers share one :class:`RateLimiter` allowing *rate* requests per
+    second (``0`` disables it), so raising the worker count cannot burst past it.
+    """
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-    codes = fetch_stock_list.get_stock_codes()
+    codes = fetch_stock_list.load_stock_codes_cached(refresh=refresh_codes)
+    existing = scan_existing()
+    tasks = [
+        (code, date)
+        for code in codes
+        for date in pending_dates(code, existing=existing.get(code, set()))
+    ]
+    logger.info("%s snapshots to download for %s stocks", len(tasks), len(codes))
+    # Create each stock directory once here; save_json then skips the mkdir.
+    base_dir = Path("data")
+    for code in {code for code, _ in tasks}:
+        (base_dir / code).mkdir(parents=True, exist_ok=True)
+
+    limiter = RateLimiter(rate) if rate > 0 else None
+    downloaded: Dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(download_date, code, date, compress=compress, limiter=limiter): code
+            for code, date in tasks
+        }
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                saved = future.result()
+            except Exception as exc:  # pragma: no cover - disk dependent
+                logger.error("%s: save failed: %s", code, exc)
+                continue
+            if saved:
+                downloaded[code] = downloaded.get(code, 0) + 1
+
     for code in codes:
-        downloaded = update_stock(code)
-        if downloaded:
-            logger.info("%s: downloaded %s entries", code, len(downloaded))
+        if downloaded.get(code):
+            logger.info("%s: downloaded %s entries", code, downloaded[code])
         else:
             logger.info("%s: no new data", code)
 
 
+def main(argv: List[str] | None = None) -> None:
+    """Command line entry point; ``--workers`` sets how many snapshot requests run at once."""
+    parser = argparse.ArgumentParser(description="Download TDCC holding distribution data")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of (stock, date) snapshot requests run concurrently (default: 8)",
+    )
+    parser.add_argument(
+        "--refresh-codes",
+        action="store_true",
+        help="re-download the MoneyDJ stock list even if the cached copy is fresh",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="store snapshots as gzip-compressed .json.gz files",
+    )
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=10,
+        help="maximum requests per second across all workers, 0 for no limit (default: 10)",
+    )
+    args = parser.parse_args(argv)
+    run(
+        max_workers=max(1, args.workers),
+        refresh_codes=args.refresh_codes,
+        compress=args.gzip,
+        rate=max(0, args.rate),
+    )
+
+
 if __name__ == "__main__":  # pragma: no cover - manual execution
-    run()
+    main()
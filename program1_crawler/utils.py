@@ -1,14 +1,78 @@
 """Utility helpers for the crawler."""
 from __future__ import annotations
 
+import gzip
 import logging
+import os
+import random
+import threading
 import time
+from collections import deque
+from pathlib import Path
 from typing import Any, Callable, Dict
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+# Pooled connections per host kept by each worker thread's session.
+POOL_SIZE = 4
+
+# Upper bound, in seconds, for a single wait between retries.
+MAX_BACKOFF = 60.0
+
+DEFAULT_UA = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# requests.Session is not documented as thread-safe, so every worker thread
+# gets its own session (and keep-alive pool) on first use.
+_local = threading.local()
+
+
+def _build_session() -> requests.Session:
+    """Create a :class:`requests.Session` that keeps TCP/TLS connections alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": DEFAULT_UA, "Connection": "keep-alive"})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the calling thread's :class:`requests.Session`, creating it lazily."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = _build_session()
+    return session
+
+
+class RateLimiter:
+    """Allow at most *rate* calls per *period* seconds across all threads.
+
+    Timestamps of recent calls are kept in a sliding window; :meth:`acquire`
+    blocks until the oldest one falls out of the window when it is full.
+    """
+
+    def __init__(self, rate: int, period: float = 1.0) -> None:
+        self.rate = max(1, rate)
+        self.period = period
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until another call is allowed and record it."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.rate:
+                    self._calls.append(now)
+                    return
+                time.sleep(self.period - (now - self._calls[0]))
+
 
 def request_with_retry(
     method: str,
@@ -16,30 +80,76 @@ def request_with_retry(
     *,
     max_retries: int = 3,
     backoff: float = 1.0,
+    limiter: RateLimiter | None = None,
     **kwargs: Any,
 ) -> requests.Response:
     """Perform an HTTP request with basic retry logic.
 
-    Parameters mirror :func:`requests.request`. Retries are attempted on any
-    :class:`requests.RequestException`.
+    Parameters mirror :func:`requests.request`. Requests go through the calling
+    thread's session (see :func:`get_session`) so consecutive calls reuse open
+    connections. Retries are
+    attempted on any :class:`requests.RequestException`.
+
+    Waits grow exponentially with random jitter so that many workers failing at
+    once do not retry in lockstep. When the server answers 429 or 503 with a
+    ``Retry-After`` header, that delay is honoured instead. Every wait is capped
+    at :data:`MAX_BACKOFF` seconds.
+
+    When a shared *limiter* is given it is acquired before every attempt, so
+    retries count against the same rate cap as first tries.
     """
     for attempt in range(1, max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
         try:
-            resp = requests.request(method, url, timeout=30, **kwargs)
+            resp = get_session().request(method, url, timeout=30, **kwargs)
             resp.raise_for_status()
             return resp
         except requests.RequestException as exc:  # pragma: no cover - network dependent
             logger.warning("Request failed (%s/%s): %s", attempt, max_retries, exc)
             if attempt == max_retries:
                 raise
-            time.sleep(backoff * attempt)
+            time.sleep(_retry_delay(exc, attempt, backoff))
 
 
-def save_json(path: str, data: Dict[str, Any]) -> None:
-    """Persist *data* to *path* in UTF-8 encoded JSON format."""
-    import json
-    from pathlib import Path
+def _retry_delay(exc: requests.RequestException, attempt: int, backoff: float) -> float:
+    """Return how long to wait before retry *attempt* + 1."""
+    response = getattr(exc, "response", None)
+    if response is not None and response.status_code in (429, 503):
+        retry_after = response.headers.get("Retry-After")
+        try:
+            return min(MAX_BACKOFF, max(0.0, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+    return min(MAX_BACKOFF, backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
 
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as fh:
-        json.dump(data, fh, ensure_ascii=False, indent=2)
+
+def save_json(
+    path: str,
+    data: Dict[str, Any],
+    compress: bool = False,
+    *,
+    ensure_dir: bool = False,
+) -> Path:
+    """Persist *data* to *path* in UTF-8 encoded JSON format.
+
+    The payload is serialised with :mod:`orjson` into a temporary sibling file
+    which is then moved into place with :func:`os.replace`, so an interrupted
+    run never leaves a truncated ``.json`` behind. With *compress* the bytes are
+    gzipped at level 3 (cheap on CPU, still several times smaller) and ``.gz``
+    is appended to the file name. Returns the path actually written.
+
+    The parent directory is expected to exist; callers writing many files into
+    one directory create it once up front. Pass *ensure_dir* to create it here.
+    """
+    target = Path(path)
+    payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    if compress:
+        target = target.with_name(target.name + ".gz")
+        payload = gzip.compress(payload, compresslevel=3)
+    if ensure_dir:
+        target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_bytes(payload)
+    os.replace(tmp, target)
+    return target
@@ -7,12 +7,15 @@
 
 import os
 import json
+import argparse
 import time
+import random
+import orjson
 import requests
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Set
-import pandas as pd
+from urllib.parse import urljoin
+from typing import List, Dict, Optional, Set, Tuple
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
@@ -20,7 +23,11 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import logging
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import lxml.html
+from lxml import etree
+from io import BytesIO
 import re
 
 # 設定日誌
@@ -34,22 +41,68 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 於瀏覽器端一次取出結果表格與統計資訊，避免逐一find_elements往返WebDriver
+EXTRACT_RESULT_JS = """
+const table = document.querySelector('table.table');
+const rows = table ? Array.from(table.querySelectorAll('tr')).map(
+    r => Array.from(r.querySelectorAll('td')).map(c => c.innerText)) : [];
+const summary = Array.from(document.querySelectorAll('.summary-item')).map(item => {
+    const label = item.querySelector('.label');
+    const value = item.querySelector('.value');
+    return label && value ? [label.innerText, value.innerText] : null;
+}).filter(pair => pair !== null);
+return [rows, summary];
+"""
+
+# 股票表第一欄：股號加上股票名稱
+STOCK_TEXT_PATTERN = re.compile(r'(\d+)\s*(.*)')
+
 class TDCCScraper:
     """TDCC股權分佈資料爬蟲"""
     
-    def __init__(self, data_dir: str = "stock_data"):
+    def __init__(self, data_dir: str = "stock_data", use_selenium: bool = False, max_workers: int = 8,
+                 max_rate: float = 5.0):
         """
         初始化爬蟲
         
         Args:
             data_dir: 資料儲存目錄
+            use_selenium: 是否改用Selenium操作網頁（除錯用，預設直接以HTTP請求查詢）
+            max_workers: HTTP模式下同時查詢的執行緒數；Selenium模式下同時啟動的瀏覽器程序數（上限為CPU核心數）
+            max_rate: 每秒最多送出的查詢數（所有執行緒共用，Selenium模式由各行程平分；0表示不限制）
         """
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.tdcc_url = "https://www.tdcc.com.tw/portal/zh/smWeb/qryStock"
+        self.tdcc_ajax_url = "https://www.tdcc.com.tw/smWeb/QryStockAjax.do"
+        self.use_selenium = use_selenium
+        self.max_workers = max_workers
+        # requests.Session不保證執行緒安全，每個工作執行緒各自持有一個
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        # 以固定間隔排程每個查詢，取代固定的time.sleep（HTTP與Selenium模式皆適用）
+        self.max_rate = max_rate
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._next_request_at = 0.0
+        self._rate_lock = threading.Lock()
+        # 查詢頁面是否提供可直接POST的查詢表單（載入日期清單時偵測）
+        self.use_query_form = False
+        # 已存在數據日期的索引，第一次查詢時掃描整個資料目錄建立
+        self._existing = None
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                          '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+        })
         self.moneydj_url = "https://moneydj.emega.com.tw/js/StockTable.htm"
         self.driver = None
         self.exclude_keywords = ['ETF', '美債', '債券', '期貨', '權證', '認購', '認售', 'REITs']
+        # 所有排除關鍵字合併為單一正則，每個名稱只需掃描一次
+        self.exclude_pattern = re.compile('|'.join(map(re.escape, self.exclude_keywords)))
+        # 股票清單每週最多變動一次，快取於本地避免每次重新下載
+        self.stock_list_cache = self.data_dir / 'stock_codes.json'
+        self.stock_list_ttl_days = 7
         
     def init_driver(self):
         """初始化Selenium WebDriver"""
@@ -60,9 +113,19 @@ class TDCCScraper:
         chrome_options.add_argument('--disable-gpu')
         chrome_options.add_argument('--window-size=1920,1080')
         chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        # 只需要表格文字，不載入圖片
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2
+        })
         
         try:
             self.driver = webdriver.Chrome(options=chrome_options)
+            # 透過DevTools封鎖圖片、樣式與字型等靜態資源
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {
+                'urls': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.css', '*.woff', '*.woff2', '*.ttf']
+            })
             logger.info("WebDriver初始化成功")
         except Exception as e:
             logger.error(f"WebDriver初始化失敗: {e}")
@@ -72,48 +135,84 @@ class TDCCScraper:
         """關閉WebDriver"""
         if self.driver:
             self.driver.quit()
+            self.driver = None
             logger.info("WebDriver已關閉")
             
-    def get_stock_list(self) -> List[Dict[str, str]]:
+    def load_cached_stock_list(self) -> Optional[List[Dict[str, str]]]:
+        """
+        讀取本地快取的股票清單
+        
+        Returns:
+            快取未過期時回傳股票清單，否則回傳None
+        """
+        try:
+            age = time.time() - self.stock_list_cache.stat().st_mtime
+            if age >= self.stock_list_ttl_days * 86400:
+                return None
+            with open(self.stock_list_cache, 'r', encoding='utf-8') as f:
+                return json.load(f)['stocks']
+        except (OSError, ValueError, KeyError):
+            return None
+            
+    def get_stock_list(self, refresh: bool = False) -> List[Dict[str, str]]:
         """
         從MoneyDJ獲取台股股票清單
         
+        Args:
+            refresh: 是否忽略本地快取強制重新下載
+            
         Returns:
             股票清單，包含股號和股票名稱
         """
+        if not refresh:
+            cached = self.load_cached_stock_list()
+            if cached:
+                logger.info(f"使用快取股票清單，共 {len(cached)} 支股票")
+                return cached
+                
         try:
             logger.info("開始獲取股票清單...")
-            response = requests.get(self.moneydj_url, timeout=30)
-            response.encoding = 'big5'
+            # 沿用共用Session，保持連線（keep-alive）並帶上相同標頭
+            response = self.session.get(self.moneydj_url, timeout=30)
+            response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
             stock_list = []
             
-            # 解析股票表格
-            tables = soup.find_all('table')
-            for table in tables:
-                rows = table.find_all('tr')
-                for row in rows:
-                    cols = row.find_all('td')
-                    if len(cols) >= 2:
-                        # 提取股號和股票名稱
-                        stock_text = cols[0].text.strip()
-                        match = re.match(r'(\d+)\s*(.*)', stock_text)
-                        if match:
-                            stock_code = match.group(1)
-                            stock_name = match.group(2) if match.group(2) else ""
-                            
-                            # 排除ETF和其他非個股
-                            if not any(keyword in stock_name for keyword in self.exclude_keywords):
-                                stock_list.append({
-                                    'code': stock_code,
-                                    'name': stock_name
-                                })
-                                
+            # 以lxml iterparse逐列串流解析Big5位元組，處理完即清除，不保留整份DOM
+            rows = etree.iterparse(BytesIO(response.content), events=('end',), tag='tr',
+                                   html=True, encoding='big5')
+            for _, row in rows:
+                cols = row.findall('td')
+                if len(cols) >= 2:
+                    # 提取股號和股票名稱
+                    stock_text = ''.join(cols[0].itertext()).strip()
+                    match = STOCK_TEXT_PATTERN.match(stock_text)
+                    if match:
+                        stock_code = match.group(1)
+                        stock_name = match.group(2) if match.group(2) else ""
+                        
+                        # 排除ETF和其他非個股
+                        if not self.exclude_pattern.search(stock_name):
+                            stock_list.append({
+                                'code': stock_code,
+                                'name': stock_name
+                            })
+                row.clear()
+                
+            # 去除重複股號（保留首次出現的順序）
+            unique_stocks = {}
+            for stock in stock_list:
+                unique_stocks.setdefault(stock['code'], stock)
+            stock_list = list(unique_stocks.values())
+            
             # 如果MoneyDJ無法訪問，使用備用股票清單
             if not stock_list:
                 logger.warning("無法從MoneyDJ獲取股票清單，使用預設清單")
                 stock_list = self.get_default_stock_list()
+            else:
+                with open(self.stock_list_cache, 'w', encoding='utf-8') as f:
+                    json.dump({'fetched_at': datetime.now().isoformat(), 'stocks': stock_list},
+                              f, ensure_ascii=False)
                 
             logger.info(f"獲取到 {len(stock_list)} 支股票")
             return stock_list
@@ -152,20 +251,152 @@ class TDCCScraper:
         Returns:
             可查詢的日期清單
         """
+        if self.use_selenium:
+            return self._get_available_dates_selenium(stock_code)
+            
         try:
+            response = self.session.get(self.tdcc_url, timeout=30)
+            response.raise_for_status()
+            doc = lxml.html.fromstring(response.content)
+            self.use_query_form = self._parse_query_form(doc) is not None
+            values = (v.strip() for v in doc.xpath('//select[@id="scaDate"]/option/@value'))
+            dates = list(dict.fromkeys(v for v in values if v))
+            logger.info(f"股票 {stock_code} 有 {len(dates)} 個可查詢日期")
+            return dates
+            
+        except Exception as e:
+            logger.error(f"獲取股票 {stock_code} 可查詢日期失敗: {e}")
+            return []
+            
+    def _parse_query_form(self, doc) -> Optional[Tuple[str, List[Tuple[str, str]], str, str]]:
+        """
+        解析查詢表單的送出位址與欄位，讓查詢直接送出與瀏覽器相同的表單
+        
+        Args:
+            doc: 查詢頁面的lxml文件
+            
+        Returns:
+            (送出位址, 表單欄位, 股票代碼欄位名稱, 日期欄位名稱)；
+            找不到表單或#StockNo、#scaDate沒有name時為None
+        """
+        forms = doc.xpath('//form[.//select[@id="scaDate"]]')
+        if not forms:
+            return None
+        form = forms[0]
+        # 欄位以name送出，股票代碼與日期需放在#StockNo與#scaDate實際的name下
+        stock_names = form.xpath('.//*[@id="StockNo"]/@name')
+        date_names = form.xpath('.//select[@id="scaDate"]/@name')
+        if not stock_names or not date_names:
+            return None
+        action = form.get('action')
+        # form_values()與瀏覽器送出的內容一致：只含已勾選的radio/checkbox與已選取的選項，不含按鈕
+        fields = form.form_values()
+        return (urljoin(self.tdcc_url, action) if action else self.tdcc_url,
+                fields, stock_names[0], date_names[0])
+        
+    def _fetch_query_form(self) -> Optional[Tuple[str, List[Tuple[str, str]], str, str]]:
+        """
+        以目前執行緒的Session重新載入查詢頁面並解析表單；
+        表單內的同步權杖（如SYNCHRONIZER_TOKEN）只能使用一次，每次查詢都需重新取得
+        
+        Returns:
+            同_parse_query_form
+        """
+        response = self._request_with_retry('GET', self.tdcc_url)
+        return self._parse_query_form(lxml.html.fromstring(response.content))
+        
+    def _throttle(self):
+        """等待至下一個可用的查詢時段，使整體查詢速率不超過max_rate"""
+        if not self.min_interval:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_request_at)
+            self._next_request_at = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+            
+    def _request_with_retry(self, method: str, url: str, payload=None,
+                            max_retries: int = 5) -> requests.Response:
+        """
+        送出查詢請求，遇到連線錯誤或5xx/429時以指數退避加隨機抖動重試
+        
+        Args:
+            method: HTTP方法（'GET' 或 'POST'）
+            url: 查詢網址
+            payload: POST的表單欄位（字典或(name, value)列表）
+            max_retries: 最多嘗試次數
+            
+        Returns:
+            成功的回應
+        """
+        for attempt in range(1, max_retries + 1):
+            self._throttle()
+            try:
+                response = self._get_session().request(method, url, data=payload, timeout=30)
+                response.raise_for_status()
+                return response
+            except requests.RequestException as e:
+                status = getattr(e.response, 'status_code', None)
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt == max_retries:
+                    raise
+                delay = min(30.0, 2 ** attempt * random.uniform(0.5, 1.5))
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                if status in (429, 503) and retry_after and retry_after.isdigit():
+                    delay = min(30.0, float(retry_after))
+                logger.warning(f"查詢失敗 ({attempt}/{max_retries})，{delay:.1f} 秒後重試: {e}")
+                time.sleep(delay)
+                
+    def _get_session(self) -> requests.Session:
+        """
+        取得目前執行緒專用的Session（沿用主Session的標頭與cookie）
+        
+        Returns:
+            requests.Session
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.session.headers)
+            session.cookies.update(self.session.cookies)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+        
+    def _enter_stock_code(self, stock_code: str) -> Select:
+        """
+        在已開啟的查詢頁面輸入股票代碼，頁面只在尚未載入時才重新導向；
+        同一支股票連續查詢多個日期時，代碼已在欄位中便不再重新輸入
+        
+        Args:
+            stock_code: 股票代碼
+            
+        Returns:
+            日期下拉選單
+        """
+        if not self.driver.current_url.startswith(self.tdcc_url):
             self.driver.get(self.tdcc_url)
-            time.sleep(2)
             
-            # 輸入股票代碼
-            stock_input = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "StockNo"))
-            )
+        # 輸入股票代碼
+        stock_input = WebDriverWait(self.driver, 10).until(
+            EC.presence_of_element_located((By.ID, "StockNo"))
+        )
+        if stock_input.get_attribute('value') != stock_code:
             stock_input.clear()
             stock_input.send_keys(stock_code)
-            
-            # 等待日期下拉選單載入
-            time.sleep(1)
-            date_select = Select(self.driver.find_element(By.ID, "scaDate"))
+        
+        # 等待日期下拉選單載入選項
+        WebDriverWait(self.driver, 10).until(
+            lambda d: len(Select(d.find_element(By.ID, "scaDate")).options) > 0
+        )
+        return Select(self.driver.find_element(By.ID, "scaDate"))
+        
+    def _get_available_dates_selenium(self, stock_code: str) -> List[str]:
+        """以Selenium操作查詢頁面獲取可查詢日期（除錯用）"""
+        try:
+            date_select = self._enter_stock_code(stock_code)
             
             # 獲取所有可選日期
             dates = []
@@ -192,59 +423,122 @@ class TDCCScraper:
         Returns:
             股權分佈數據
         """
+        if self.use_selenium:
+            return self._scrape_stock_data_selenium(stock_code, date)
+            
         try:
-            self.driver.get(self.tdcc_url)
-            time.sleep(2)
+            # 有查詢表單時以新取得的表單欄位（含權杖）送出，否則改用AJAX查詢介面
+            form = self._fetch_query_form() if self.use_query_form else None
+            if form:
+                url, fields, stock_field, date_field = form
+                payload = [(name, value) for name, value in fields
+                           if name not in (stock_field, date_field)]
+                payload += [(stock_field, stock_code), (date_field, date)]
+            else:
+                url = self.tdcc_ajax_url
+                payload = {
+                    'scaDates': date,
+                    'scaDate': date,
+                    'SqlMethod': 'StockNo',
+                    'StockNo': stock_code,
+                    'stkNo': stock_code,
+                }
+            response = self._request_with_retry('POST', url, payload)
             
-            # 輸入股票代碼
-            stock_input = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "StockNo"))
-            )
-            stock_input.clear()
-            stock_input.send_keys(stock_code)
+            if 'json' in response.headers.get('Content-Type', ''):
+                result = response.json()
+                rows = result.get('data', []) if isinstance(result, dict) else result
+            else:
+                rows = self._parse_distribution_rows(response.content)
+                
+            data = {
+                'stock_code': stock_code,
+                'date': date,
+                'distribution': self._rows_to_distribution(rows)
+            }
+            if not data['distribution']:
+                logger.warning(f"股票 {stock_code} 日期 {date} 查無股權分佈數據")
+                return None
+            return data
+            
+        except Exception as e:
+            logger.error(f"抓取股票 {stock_code} 日期 {date} 數據失敗: {e}")
+            return None
+            
+    @staticmethod
+    def _rows_to_distribution(rows) -> List[Dict[str, str]]:
+        """
+        將表格列轉為股權分佈資料
+        
+        Args:
+            rows: 每列儲存格文字（不含標題行）
+            
+        Returns:
+            股權分佈清單
+        """
+        distribution = []
+        for cols in rows:
+            if len(cols) >= 4:
+                distribution.append({
+                    'level': str(cols[0]).strip(),  # 持股分級
+                    'holders': str(cols[1]).strip().replace(',', ''),  # 人數
+                    'shares': str(cols[2]).strip().replace(',', ''),  # 股數
+                    'percentage': str(cols[3]).strip()  # 占比
+                })
+        return distribution
+        
+    @staticmethod
+    def _parse_distribution_rows(content: bytes) -> List[List[str]]:
+        """
+        解析查詢結果HTML中的股權分佈表格
+        
+        Args:
+            content: 回應內容
+            
+        Returns:
+            每列儲存格文字（已跳過標題行）
+        """
+        doc = lxml.html.fromstring(content)
+        tables = doc.xpath('//table[contains(concat(" ", normalize-space(@class), " "), " table ")]')
+        if not tables:
+            return []
+        rows = tables[0].findall('.//tr')
+        return [[td.text_content() for td in row.findall('td')] for row in rows[1:]]
+        
+    def _scrape_stock_data_selenium(self, stock_code: str, date: str) -> Optional[Dict]:
+        """以Selenium操作查詢頁面抓取股權分佈數據（除錯用）"""
+        try:
+            date_select = self._enter_stock_code(stock_code)
             
             # 選擇日期
-            time.sleep(1)
-            date_select = Select(self.driver.find_element(By.ID, "scaDate"))
             date_select.select_by_value(date)
             
-            # 點擊查詢按鈕
+            # 記下舊的結果表格，查詢後等待其被替換，而非固定等待秒數
+            old_tables = self.driver.find_elements(By.CLASS_NAME, "table")
+            
+            # 點擊查詢按鈕（與HTTP模式相同受max_rate限制）
             query_button = self.driver.find_element(By.ID, "btnQuery")
+            self._throttle()
             query_button.click()
             
             # 等待結果載入
-            time.sleep(3)
-            
-            # 解析結果表格
-            table = WebDriverWait(self.driver, 10).until(
+            if old_tables:
+                WebDriverWait(self.driver, 10).until(EC.staleness_of(old_tables[0]))
+                
+            # 等待結果表格出現
+            WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.CLASS_NAME, "table"))
             )
             
-            # 提取表格數據
-            rows = table.find_elements(By.TAG_NAME, "tr")
+            # 以單次execute_script取出表格數據與其他統計資訊
+            rows, summary_info = self.driver.execute_script(EXTRACT_RESULT_JS)
             data = {
                 'stock_code': stock_code,
                 'date': date,
-                'distribution': []
+                'distribution': self._rows_to_distribution(rows[1:])  # 跳過標題行
             }
-            
-            for row in rows[1:]:  # 跳過標題行
-                cols = row.find_elements(By.TAG_NAME, "td")
-                if len(cols) >= 4:
-                    distribution_item = {
-                        'level': cols[0].text.strip(),  # 持股分級
-                        'holders': cols[1].text.strip().replace(',', ''),  # 人數
-                        'shares': cols[2].text.strip().replace(',', ''),  # 股數
-                        'percentage': cols[3].text.strip()  # 占比
-                    }
-                    data['distribution'].append(distribution_item)
-                    
-            # 獲取其他統計資訊
-            summary_info = self.driver.find_elements(By.CLASS_NAME, "summary-item")
-            for item in summary_info:
-                label = item.find_element(By.CLASS_NAME, "label").text.strip()
-                value = item.find_element(By.CLASS_NAME, "value").text.strip()
-                data[label] = value
+            for label, value in summary_info:
+                data[label.strip()] = value.strip()
                 
             return data
             
@@ -261,20 +555,76 @@ class TDCCScraper:
             date: 日期
             data: 股權分佈數據
         """
-        # 建立股票資料夾
+        # 股票資料夾已由run()在下載前建立
         stock_dir = self.data_dir / stock_code
-        stock_dir.mkdir(exist_ok=True)
         
         # 格式化日期 (YYYYMMDD -> YYYY-MM-DD)
         formatted_date = f"{date[:4]}-{date[4:6]}-{date[6:8]}"
         
-        # 儲存為JSON檔案
+        # 儲存為JSON檔案（orjson直接輸出UTF-8位元組）；先寫入暫存檔再以os.replace替換，
+        # 中斷時不會留下不完整的JSON
         file_path = stock_dir / f"{formatted_date}.json"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        tmp_path = file_path.with_name(file_path.name + '.tmp')
+        tmp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp_path, file_path)
             
         logger.info(f"已儲存 {stock_code} 在 {formatted_date} 的數據")
         
+    def download_date(self, stock_code: str, date: str) -> bool:
+        """
+        下載並儲存單一股票單一日期的數據
+        
+        Args:
+            stock_code: 股票代碼
+            date: 日期 (YYYYMMDD格式)
+            
+        Returns:
+            是否成功儲存
+        """
+        data = self.scrape_stock_data(stock_code, date)
+        if not data:
+            return False
+        self.save_data(stock_code, date, data)
+        return True
+        
+    def _scan_dates(self, stock_dir) -> Set[str]:
+        """
+        列出單一股票資料夾內已存在的數據日期
+        
+        Args:
+            stock_dir: 股票資料夾路徑
+            
+        Returns:
+            已存在的日期集合 (YYYYMMDD)
+        """
+        try:
+            with os.scandir(stock_dir) as entries:
+                names = [entry.name for entry in entries]
+        except FileNotFoundError:
+            return set()
+            
+        # 檔名固定為 YYYY-MM-DD.json（15字元），直接切片轉為 YYYYMMDD
+        return {
+            name[:4] + name[5:7] + name[8:10]
+            for name in names
+            if len(name) == 15 and name.endswith('.json') and name[4] == name[7] == '-'
+        }
+        
+    def scan_existing_dates(self) -> Dict[str, Set[str]]:
+        """
+        一次掃描資料目錄，建立所有股票已存在日期的索引
+        
+        Returns:
+            股票代碼對應已存在日期集合
+        """
+        index = {}
+        with os.scandir(self.data_dir) as stocks:
+            for stock in stocks:
+                if stock.is_dir():
+                    index[stock.name] = self._scan_dates(stock.path)
+        self._existing = index
+        return index
+        
     def check_existing_dates(self, stock_code: str) -> Set[str]:
         """
         檢查本地已存在的數據日期
@@ -285,33 +635,26 @@ class TDCCScraper:
         Returns:
             已存在的日期集合
         """
-        stock_dir = self.data_dir / stock_code
-        if not stock_dir.exists():
-            return set()
-            
-        existing_dates = set()
-        for file_path in stock_dir.glob("*.json"):
-            # 從檔名提取日期 (YYYY-MM-DD.json -> YYYYMMDD)
-            date_str = file_path.stem
-            date_parts = date_str.split('-')
-            if len(date_parts) == 3:
-                existing_dates.add(''.join(date_parts))
-                
-        return existing_dates
+        if self._existing is None:
+            self.scan_existing_dates()
+        return self._existing.get(stock_code, set())
         
-    def run(self, limit: Optional[int] = None):
+    def run(self, limit: Optional[int] = None, refresh_codes: bool = False):
         """
         執行爬蟲主程序
         
         Args:
             limit: 限制爬取的股票數量（用於測試）
+            refresh_codes: 是否強制重新下載股票清單
         """
         try:
-            # 初始化WebDriver
-            self.init_driver()
+            # 僅在Selenium模式下初始化WebDriver，查詢頁面整個執行只載入一次
+            if self.use_selenium:
+                self.init_driver()
+                self.driver.get(self.tdcc_url)
             
             # 獲取股票清單
-            stock_list = self.get_stock_list()
+            stock_list = self.get_stock_list(refresh=refresh_codes)
             
             if limit:
                 stock_list = stock_list[:limit]
@@ -319,6 +662,15 @@ class TDCCScraper:
             total_stocks = len(stock_list)
             logger.info(f"開始爬取 {total_stocks} 支股票的數據")
             
+            # 可查詢日期與股票無關，整個執行只需抓取一次
+            available_dates = self.get_available_dates(stock_list[0]['code']) if stock_list else []
+            if not available_dates:
+                logger.warning("無可查詢日期，結束執行")
+                return
+            available_set = frozenset(available_dates)
+                
+            # 先彙整所有待下載的 (股票, 日期)
+            tasks = []
             for idx, stock_info in enumerate(stock_list, 1):
                 stock_code = stock_info['code']
                 stock_name = stock_info['name']
@@ -328,48 +680,103 @@ class TDCCScraper:
                 # 檢查已存在的數據
                 existing_dates = self.check_existing_dates(stock_code)
                 
-                # 獲取可查詢的日期
-                available_dates = self.get_available_dates(stock_code)
-                
-                if not available_dates:
-                    logger.warning(f"股票 {stock_code} 無可查詢日期，跳過")
-                    continue
-                    
                 # 過濾出需要下載的日期
-                dates_to_download = [d for d in available_dates if d not in existing_dates]
+                missing_dates = available_set - existing_dates
                 
-                if not dates_to_download:
+                if not missing_dates:
                     logger.info(f"股票 {stock_code} 所有數據已是最新，跳過")
                     continue
                     
+                dates_to_download = sorted(missing_dates)
                 logger.info(f"股票 {stock_code} 需要下載 {len(dates_to_download)} 個日期的數據")
                 
-                # 下載數據
-                for date in dates_to_download:
-                    data = self.scrape_stock_data(stock_code, date)
-                    if data:
-                        self.save_data(stock_code, date, data)
-                        time.sleep(1)  # 避免請求過快
-                        
-                # 每處理完一支股票休息一下
-                time.sleep(2)
+                # 建立股票資料夾（每支股票一次）
+                (self.data_dir / stock_code).mkdir(exist_ok=True)
+                tasks.extend((stock_code, date) for date in dates_to_download)
                 
+            logger.info(f"共 {len(tasks)} 筆數據待下載")
+            
+            # 下載數據
+            saved = 0
+            if self.max_workers <= 1:
+                for stock_code, date in tasks:
+                    saved += self.download_date(stock_code, date)
+            elif self.use_selenium:
+                # WebDriver無法跨執行緒共用，改以多個行程各自啟動瀏覽器；
+                # 主行程的瀏覽器只用於取得日期清單，先關閉以免閒置佔用資源
+                self.close_driver()
+                workers = min(self.max_workers, os.cpu_count() or 1)
+                # 連續切分，讓同一支股票的日期盡量落在同一個行程依序查詢
+                size = -(-len(tasks) // workers) if tasks else 1
+                batches = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+                # 各行程平分整體查詢速率，合計不超過max_rate
+                worker_rate = self.max_rate / len(batches) if batches else self.max_rate
+                with ProcessPoolExecutor(max_workers=len(batches) or 1) as executor:
+                    futures = [executor.submit(_selenium_worker, str(self.data_dir), batch, worker_rate)
+                               for batch in batches]
+                    for future in as_completed(futures):
+                        saved += future.result()
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [executor.submit(self.download_date, code, date) for code, date in tasks]
+                    for future in as_completed(futures):
+                        saved += future.result()
+                        
+            logger.info(f"完成下載 {saved}/{len(tasks)} 筆數據")
+            
         except KeyboardInterrupt:
             logger.info("使用者中斷執行")
         except Exception as e:
             logger.error(f"執行失敗: {e}")
         finally:
             self.close_driver()
+            for session in self._sessions:
+                session.close()
+            self.session.close()
             
+def _selenium_worker(data_dir: str, tasks: List[tuple], max_rate: float) -> int:
+    """
+    Selenium模式的工作行程：啟動自己的WebDriver依序下載分配到的數據
+    
+    Args:
+        data_dir: 資料儲存目錄
+        tasks: 待下載的 (股票代碼, 日期) 清單
+        max_rate: 此行程每秒最多送出的查詢數（0表示不限制）
+        
+    Returns:
+        成功儲存的筆數
+    """
+    scraper = TDCCScraper(data_dir=data_dir, use_selenium=True, max_workers=1, max_rate=max_rate)
+    saved = 0
+    try:
+        scraper.init_driver()
+        scraper.driver.get(scraper.tdcc_url)
+        for stock_code, date in tasks:
+            saved += scraper.download_date(stock_code, date)
+    finally:
+        scraper.close_driver()
+        scraper.session.close()
+    return saved
+    
 def main():
     """主程序"""
-    scraper = TDCCScraper(data_dir="stock_data")
-    
-    # 可以設定limit參數來限制爬取數量（測試用）
-    # scraper.run(limit=5)  # 只爬取前5支股票
+    parser = argparse.ArgumentParser(description='TDCC股權分佈資料爬蟲')
+    parser.add_argument('--data-dir', default='stock_data', help='資料儲存目錄 (預設: stock_data)')
+    parser.add_argument('--limit', type=int, help='限制爬取的股票數量（測試用）')
+    parser.add_argument('--selenium', action='store_true', help='改用Selenium操作網頁（除錯用）')
+    parser.add_argument('--workers', type=int,
+                        help='同時查詢的數量：HTTP模式為執行緒數 (預設: 8)；'
+                             'Selenium模式為同時啟動的Chrome數 (預設: 1)')
+    parser.add_argument('--max-rate', type=float, default=5.0,
+                        help='每秒最多查詢次數，0表示不限制 (預設: 5)')
+    parser.add_argument('--refresh-codes', action='store_true', help='忽略快取，重新下載股票清單')
+    args = parser.parse_args()
     
-    # 正式執行（爬取所有股票）
-    scraper.run()
+    # Selenium模式每個工作程序各自啟動一個Chrome，未指定時只用一個
+    workers = args.workers if args.workers is not None else (1 if args.selenium else 8)
+    scraper = TDCCScraper(data_dir=args.data_dir, use_selenium=args.selenium,
+                          max_workers=max(1, workers), max_rate=max(0.0, args.max_rate))
+    scraper.run(limit=args.limit, refresh_codes=args.refresh_codes)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
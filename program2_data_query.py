@@ -5,17 +5,31 @@
 """
 
 import os
-import json
+import re
+import orjson
+import bisect
+import threading
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from bs4 import BeautifulSoup
-import matplotlib.pyplot as plt
+import lxml.html
+import matplotlib
+matplotlib.use('Agg')  # 僅輸出圖片檔，使用非互動式後端
+# 簡化路徑並分段光柵化，加快Agg繪製長時間序列
+matplotlib.rcParams['path.simplify'] = True
+matplotlib.rcParams['path.simplify_threshold'] = 1.0
+matplotlib.rcParams['agg.path.chunksize'] = 10000
 import matplotlib.dates as mdates
-from matplotlib.patches import Rectangle
+from matplotlib import colormaps
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
 import openpyxl
 from openpyxl import Workbook
 from openpyxl.chart import LineChart, Reference, BarChart
@@ -34,93 +48,157 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 程式一輸出的每日資料檔名 (YYYY-MM-DD.json)
+_DATE_FILE_RE = re.compile(r'\d{4}-\d{2}-\d{2}\.json')
+
+# 數值欄位中需去除的千分位逗號、百分比符號與空白
+_NUMBER_NOISE_RE = re.compile(r'[,%\s]')
+
+# 每支股票的彙整快取（所有日期的股權分佈，Parquet格式）
+CACHE_FILE_NAME = 'cache.parquet'
+# 快取檔metadata中記錄來源日期的鍵值
+CACHE_DATES_KEY = b'tdcc_dates'
+
+# 三個輸出表格：(工作表名稱, 表格鍵值, 圖表標題)
+SHEET_CONFIGS = [
+    ('人數', 'holders', 'Holders Distribution'),
+    ('股數', 'shares', 'Shares Distribution'),
+    ('占比', 'percentage', 'Percentage Distribution')
+]
+
+def _as_datetime(value: Union[str, datetime]) -> datetime:
+    """
+    將日期統一為datetime，已解析的datetime直接沿用，不重複解析
+    
+    Args:
+        value: 日期字串 (YYYY-MM-DD) 或datetime
+        
+    Returns:
+        datetime
+    """
+    return value if isinstance(value, datetime) else datetime.strptime(value, "%Y-%m-%d")
+    
 class StockDataQuery:
     """股權分佈資料查詢與整理系統"""
     
-    def __init__(self, data_dir: str = "stock_data"):
+    def __init__(self, data_dir: str = "stock_data", kline_cache_dir: str = "kline_cache"):
         """
         初始化查詢系統
         
         Args:
             data_dir: 資料儲存目錄
+            kline_cache_dir: K線月資料快取目錄
         """
         self.data_dir = Path(data_dir)
         self.wearn_url = "https://stock.wearn.com/cdata.asp"
+        # 共用連線並固定User-Agent，避免每個月份重新建立TCP/TLS連線
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                          '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+        })
+        # requests.Session不保證執行緒安全，並行抓取K線時每個執行緒各自持有一個
+        self._local = threading.local()
+        # 已結束月份的K線不會再變動，快取於本地
+        self.kline_cache_dir = Path(kline_cache_dir)
+        # 三張圖表共用同一個Figure，首次繪圖時建立
+        self._figure = None
+        self._canvas = None
+        # 已繪製K線的座標軸與對應的K線數據，三張圖表只需繪製一次K線
+        self._chart_ax = None
+        self._kline_source = None
+        # 各股票的可用日期快取：股號 -> (資料夾修改時間, 日期列表)
+        self._dates_cache: Dict[str, Tuple[float, List[str]]] = {}
+        
+    def list_available_dates(self, stock_code: str) -> List[str]:
+        """
+        列出股票資料夾中所有可用的日期
         
-    def find_closest_date(self, stock_code: str, target_date: str, 
+        Args:
+            stock_code: 股票代碼
+            
+        Returns:
+            已排序的日期列表 (YYYY-MM-DD)；資料夾不存在時為空列表
+        """
+        stock_dir = self.data_dir / stock_code
+        try:
+            mtime = os.stat(stock_dir).st_mtime
+        except FileNotFoundError:
+            return []
+            
+        # 資料夾內容未變動（修改時間相同）時直接沿用上次的結果
+        cached = self._dates_cache.get(stock_code)
+        if cached and cached[0] == mtime:
+            return cached[1]
+            
+        # os.scandir 直接提供檔名與檔案類型，不需逐檔 stat
+        try:
+            with os.scandir(stock_dir) as entries:
+                available_dates = [entry.name[:-5] for entry in entries
+                                   if _DATE_FILE_RE.fullmatch(entry.name) and entry.is_file()]
+        except FileNotFoundError:
+            return []
+            
+        available_dates.sort()
+        self._dates_cache[stock_code] = (mtime, available_dates)
+        return available_dates
+        
+    def find_closest_date(self, stock_code: str, target_date: Union[str, datetime],
                          direction: str = "after") -> Optional[Tuple[str, bool]]:
         """
         尋找最接近的可用日期
         
         Args:
             stock_code: 股票代碼
-            target_date: 目標日期 (YYYY-MM-DD)
+            target_date: 目標日期 (YYYY-MM-DD字串或datetime)
             direction: 搜尋方向 ("after" 或 "before")
             
         Returns:
             (最接近的日期, 是否有警告)
         """
-        stock_dir = self.data_dir / stock_code
-        if not stock_dir.exists():
-            logger.error(f"股票 {stock_code} 資料夾不存在")
-            return None
-            
-        # 獲取所有可用日期
-        available_dates = []
-        for file_path in stock_dir.glob("*.json"):
-            date_str = file_path.stem  # YYYY-MM-DD
-            available_dates.append(date_str)
-            
+        # 獲取所有可用日期（資料夾不存在時為空列表，不另外檢查是否存在）
+        available_dates = self.list_available_dates(stock_code)
         if not available_dates:
-            logger.error(f"股票 {stock_code} 無可用數據")
+            logger.error(f"股票 {stock_code} 資料夾不存在或無可用數據")
             return None
             
-        available_dates.sort()
-        target = datetime.strptime(target_date, "%Y-%m-%d")
+        # 正規化為補零的 YYYY-MM-DD，使日期可直接以字串比較並二分搜尋
+        target = _as_datetime(target_date).strftime("%Y-%m-%d")
         
         # 尋找大於等於目標日期的最近日期
         if direction == "after":
-            for date_str in available_dates:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                if date_obj >= target:
-                    return date_str, False
-                    
+            idx = bisect.bisect_left(available_dates, target)
+            if idx < len(available_dates):
+                return available_dates[idx], False
+                
             # 如果找不到，回退到小於目標日期的最近日期
-            logger.warning(f"找不到 {target_date} 之後的數據，使用之前最近的日期")
-            for date_str in reversed(available_dates):
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                if date_obj < target:
-                    return date_str, True
+            logger.warning(f"找不到 {target} 之後的數據，使用之前最近的日期")
+            return available_dates[-1], True
                     
         # 尋找小於等於目標日期的最近日期
-        else:
-            for date_str in reversed(available_dates):
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                if date_obj <= target:
-                    return date_str, False
+        idx = bisect.bisect_right(available_dates, target) - 1
+        if idx >= 0:
+            return available_dates[idx], False
                     
         return available_dates[0], True
         
-    def load_stock_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+    def load_stock_data(self, stock_code: str, start_date: Union[str, datetime],
+                        end_date: Union[str, datetime]) -> pd.DataFrame:
         """
         載入指定期間的股權分佈數據
         
         Args:
             stock_code: 股票代碼
-            start_date: 起始日期 (YYYY-MM-DD)
-            end_date: 結束日期 (YYYY-MM-DD)
+            start_date: 起始日期 (YYYY-MM-DD字串或datetime)
+            end_date: 結束日期 (YYYY-MM-DD字串或datetime)
             
         Returns:
             股權分佈數據DataFrame
         """
-        stock_dir = self.data_dir / stock_code
-        if not stock_dir.exists():
-            logger.error(f"股票 {stock_code} 資料夾不存在")
-            return pd.DataFrame()
-            
         # 尋找最接近的起始和結束日期
-        actual_start, start_warning = self.find_closest_date(stock_code, start_date, "after") or (None, False)
-        actual_end, end_warning = self.find_closest_date(stock_code, end_date, "before") or (None, False)
+        start_dt, end_dt = _as_datetime(start_date), _as_datetime(end_date)
+        actual_start, start_warning = self.find_closest_date(stock_code, start_dt, "after") or (None, False)
+        actual_end, end_warning = self.find_closest_date(stock_code, end_dt, "before") or (None, False)
         
         if not actual_start or not actual_end:
             logger.error("無法找到有效的日期範圍")
@@ -129,21 +207,86 @@ class StockDataQuery:
         logger.info(f"實際查詢期間: {actual_start} 到 {actual_end}")
         
         if start_warning:
-            logger.warning(f"起始日期 {start_date} 無可用數據，使用 {actual_start}")
+            logger.warning(f"起始日期 {start_dt:%Y-%m-%d} 無可用數據，使用 {actual_start}")
         if end_warning:
-            logger.warning(f"結束日期 {end_date} 無可用數據，使用 {actual_end}")
-            
-        # 載入期間內的所有數據
-        data_list = []
-        for file_path in sorted(stock_dir.glob("*.json")):
-            date_str = file_path.stem
-            if actual_start <= date_str <= actual_end:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    data['date_str'] = date_str
-                    data_list.append(data)
-                    
-        return self.process_distribution_data(data_list)
+            logger.warning(f"結束日期 {end_dt:%Y-%m-%d} 無可用數據，使用 {actual_end}")
+            
+        available_dates = self.list_available_dates(stock_code)
+        return self._load_cached_distribution(stock_code, available_dates, actual_start, actual_end)
+        
+    def _load_cached_distribution(self, stock_code: str, available_dates: List[str],
+                                  start: str, end: str) -> pd.DataFrame:
+        """
+        從股票的Parquet快取讀取期間內的數據；快取收錄的日期與資料夾內的檔案不一致時，
+        讀取全部JSON重建快取
+        
+        Args:
+            stock_code: 股票代碼
+            available_dates: 資料夾內所有可用日期（已排序）
+            start: 起始日期 (YYYY-MM-DD)
+            end: 結束日期 (YYYY-MM-DD)
+            
+        Returns:
+            股權分佈數據DataFrame
+        """
+        stock_dir = self.data_dir / stock_code
+        cache_file = stock_dir / CACHE_FILE_NAME
+        source_dates = ','.join(available_dates).encode()
+        start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+        
+        # 快取有效時只讀取期間內的列（Parquet依條件過濾）
+        try:
+            metadata = pq.read_schema(cache_file).metadata or {}
+            if metadata.get(CACHE_DATES_KEY) == source_dates:
+                table = pq.read_table(cache_file, filters=[('date', '>=', start_ts), ('date', '<=', end_ts)])
+                return table.to_pandas()
+        except (OSError, pa.ArrowInvalid):
+            pass
+            
+        # 載入所有日期的數據（檔案讀取為I/O密集，以執行緒平行處理）
+        logger.info(f"建立股票 {stock_code} 的資料快取")
+        file_paths = [stock_dir / f"{date_str}.json" for date_str in available_dates]
+        with ThreadPoolExecutor(max_workers=max(1, min(16, len(file_paths)))) as executor:
+            loaded = list(executor.map(self._load_json_file, file_paths))
+        # 無法讀取的檔案已略過，快取只記錄成功載入的日期，檔案修復後會再次重建
+        data_list = [data for data in loaded if data is not None]
+        source_dates = ','.join(data['date_str'] for data in data_list).encode()
+        df = self.process_distribution_data(data_list)
+        if df.empty:
+            return df
+            
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[CACHE_DATES_KEY] = source_dates
+            tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+            pq.write_table(table.replace_schema_metadata(metadata), tmp_file)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.warning(f"無法寫入資料快取: {e}")
+            
+        # 篩選期間內的數據
+        mask = (df['date'] >= start_ts) & (df['date'] <= end_ts)
+        return df[mask].reset_index(drop=True)
+        
+    @staticmethod
+    def _load_json_file(file_path: Path) -> Optional[Dict]:
+        """
+        讀取單一日期的JSON檔案，並附上日期字串
+        
+        Args:
+            file_path: JSON檔案路徑 (YYYY-MM-DD.json)
+            
+        Returns:
+            原始數據字典；檔案無法讀取或內容毀損時為None
+        """
+        try:
+            data = orjson.loads(file_path.read_bytes())
+        except (OSError, ValueError) as e:
+            logger.warning(f"略過無法讀取的數據檔 {file_path}: {e}")
+            return None
+        data['date_str'] = file_path.stem
+        return data
         
     def process_distribution_data(self, data_list: List[Dict]) -> pd.DataFrame:
         """
@@ -158,42 +301,43 @@ class StockDataQuery:
         if not data_list:
             return pd.DataFrame()
             
-        processed_data = []
-        for data in data_list:
-            date_str = data['date_str']
-            for item in data['distribution']:
-                processed_data.append({
-                    'date': date_str,
-                    'level': item['level'],
-                    'holders': int(item['holders']) if item['holders'] else 0,
-                    'shares': int(item['shares']) if item['shares'] else 0,
-                    'percentage': float(item['percentage'].replace('%', '')) if item['percentage'] else 0
-                })
-                
-        df = pd.DataFrame(processed_data)
-        df['date'] = pd.to_datetime(df['date'])
+        # 單次走訪收集原始字串，數值轉換交由pandas向量化處理
+        rows = [
+            (data['date_str'], item['level'], item['holders'], item['shares'], item['percentage'])
+            for data in data_list
+            for item in data['distribution']
+        ]
+        df = pd.DataFrame(rows, columns=['date', 'level', 'holders', 'shares', 'percentage'])
+        
+        for column in ('holders', 'shares', 'percentage'):
+            values = df[column].astype(str).str.replace(_NUMBER_NOISE_RE, '', regex=True)
+            df[column] = pd.to_numeric(values, errors='coerce').fillna(0)
+        df[['holders', 'shares']] = df[['holders', 'shares']].astype('int64')
+        
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
         return df
         
-    def fetch_kline_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+    def fetch_kline_data(self, stock_code: str, start_date: Union[str, datetime],
+                         end_date: Union[str, datetime]) -> pd.DataFrame:
         """
         從Wearn.com獲取K線數據
         
         Args:
             stock_code: 股票代碼
-            start_date: 起始日期 (YYYY-MM-DD)
-            end_date: 結束日期 (YYYY-MM-DD)
+            start_date: 起始日期 (YYYY-MM-DD字串或datetime)
+            end_date: 結束日期 (YYYY-MM-DD字串或datetime)
             
         Returns:
             K線數據DataFrame
         """
         try:
             # 轉換日期格式
-            start = datetime.strptime(start_date, "%Y-%m-%d")
-            end = datetime.strptime(end_date, "%Y-%m-%d")
+            start = _as_datetime(start_date)
+            end = _as_datetime(end_date)
             
             # 計算需要查詢的年月
             months_to_query = []
-            current = start
+            current = start.replace(day=1)  # 由月初起算，避免31日時replace(month=...)失敗
             while current <= end:
                 year = current.year - 1911  # 轉換為民國年
                 month = current.month
@@ -204,51 +348,20 @@ class StockDataQuery:
                 else:
                     current = current.replace(month=current.month + 1)
                     
+            # 各月份請求互不相依，以執行緒池並行抓取（每個執行緒使用自己的Session）
             kline_data = []
-            for year, month in months_to_query:
-                params = {
-                    'Year': year,
-                    'month': f"{month:02d}",
-                    'kind': stock_code
-                }
-                
-                response = requests.get(self.wearn_url, params=params, timeout=30)
-                response.encoding = 'big5'
-                
-                # 解析HTML獲取K線數據
-                soup = BeautifulSoup(response.text, 'html.parser')
-                tables = soup.find_all('table')
+            with ThreadPoolExecutor(max_workers=max(1, min(8, len(months_to_query)))) as executor:
+                for month_data in executor.map(lambda ym: self._fetch_month(stock_code, *ym),
+                                               months_to_query):
+                    kline_data.extend(month_data)
                 
-                for table in tables:
-                    rows = table.find_all('tr')
-                    for row in rows[1:]:  # 跳過標題行
-                        cols = row.find_all('td')
-                        if len(cols) >= 6:
-                            try:
-                                date_text = cols[0].text.strip()
-                                # 轉換民國年為西元年
-                                if '/' in date_text:
-                                    parts = date_text.split('/')
-                                    if len(parts) == 3:
-                                        west_year = int(parts[0]) + 1911
-                                        date_str = f"{west_year}/{parts[1]}/{parts[2]}"
-                                        
-                                        kline_data.append({
-                                            'date': pd.to_datetime(date_str),
-                                            'open': float(cols[1].text.strip().replace(',', '')),
-                                            'high': float(cols[2].text.strip().replace(',', '')),
-                                            'low': float(cols[3].text.strip().replace(',', '')),
-                                            'close': float(cols[4].text.strip().replace(',', '')),
-                                            'volume': int(cols[5].text.strip().replace(',', ''))
-                                        })
-                            except (ValueError, IndexError) as e:
-                                continue
-                                
             if kline_data:
                 df = pd.DataFrame(kline_data)
+                # 日期已於解析時組成固定的 YYYY-MM-DD，指定格式以免逐筆推斷
+                df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
                 df = df.sort_values('date')
                 # 過濾日期範圍
-                df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+                df = df[(df['date'] >= start) & (df['date'] <= end)]
                 return df
             else:
                 logger.warning("無法獲取K線數據")
@@ -258,6 +371,92 @@ class StockDataQuery:
             logger.error(f"獲取K線數據失敗: {e}")
             return pd.DataFrame()
             
+    def _fetch_month(self, stock_code: str, year: int, month: int) -> List[Dict]:
+        """
+        獲取單一月份的K線數據；已結束的月份優先讀取本地快取
+        
+        Args:
+            stock_code: 股票代碼
+            year: 民國年
+            month: 月份
+            
+        Returns:
+            該月每日K線數據列表（日期為 YYYY-MM-DD 字串）
+        """
+        west_year = year + 1911
+        today = datetime.now()
+        month_closed = (west_year, month) < (today.year, today.month)
+        cache_file = self.kline_cache_dir / stock_code / f"{west_year}-{month:02d}.json"
+        if month_closed:
+            # 快取檔毀損（例如寫入中斷）時視為未快取，重新抓取後覆寫
+            try:
+                return orjson.loads(cache_file.read_bytes())
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning(f"K線快取 {cache_file} 無法讀取，重新抓取: {e}")
+            
+        params = {
+            'Year': year,
+            'month': f"{month:02d}",
+            'kind': stock_code
+        }
+        
+        response = self._get_session().get(self.wearn_url, params=params, timeout=30)
+        
+        # 解析HTML獲取K線數據：直接以lxml解析Big5位元組，XPath取出各表格標題行之後的資料列
+        doc = lxml.html.fromstring(response.content,
+                                   parser=lxml.html.HTMLParser(encoding='big5'))
+        
+        month_data = []
+        for row in doc.xpath('//table//tr[position()>1]'):
+            cols = row.xpath('./td')
+            if len(cols) >= 6:
+                try:
+                    date_text = cols[0].text_content().strip()
+                    # 轉換民國年為西元年
+                    if '/' in date_text:
+                        parts = date_text.split('/')
+                        if len(parts) == 3:
+                            west = int(parts[0]) + 1911
+                            values = [_NUMBER_NOISE_RE.sub('', col.text_content()) for col in cols[1:6]]
+                            month_data.append({
+                                'date': f"{west}-{int(parts[1]):02d}-{int(parts[2]):02d}",
+                                'open': float(values[0]),
+                                'high': float(values[1]),
+                                'low': float(values[2]),
+                                'close': float(values[3]),
+                                'volume': int(values[4])
+                            })
+                except (ValueError, IndexError) as e:
+                    continue
+                        
+        if month_closed and month_data:
+            # 先寫入暫存檔再以os.replace替換，中斷時不會留下不完整的快取
+            try:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+                tmp_file.write_bytes(orjson.dumps(month_data))
+                os.replace(tmp_file, cache_file)
+            except OSError as e:
+                logger.warning(f"無法寫入K線快取: {e}")
+            
+        return month_data
+        
+    def _get_session(self) -> requests.Session:
+        """
+        取得目前執行緒專用的Session（沿用主Session的標頭）
+        
+        Returns:
+            requests.Session
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.session.headers)
+            self._local.session = session
+        return session
+        
     def create_tables(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
         """
         建立三個分析表格
@@ -268,34 +467,16 @@ class StockDataQuery:
         Returns:
             包含三個表格的字典
         """
-        tables = {}
-        
-        # 表格1: 人數
-        pivot_holders = df.pivot_table(
+        # 一次樞紐三個欄位，再依第一層欄位拆成三個表格：
+        # 表格1: 人數、表格2: 股數/單位數、表格3: 占集保庫存數比例
+        metrics = ['holders', 'shares', 'percentage']
+        pivot = df.pivot_table(
             index='date',
             columns='level',
-            values='holders',
+            values=metrics,
             aggfunc='sum'
         )
-        tables['holders'] = pivot_holders
-        
-        # 表格2: 股數/單位數
-        pivot_shares = df.pivot_table(
-            index='date',
-            columns='level',
-            values='shares',
-            aggfunc='sum'
-        )
-        tables['shares'] = pivot_shares
-        
-        # 表格3: 占集保庫存數比例
-        pivot_percentage = df.pivot_table(
-            index='date',
-            columns='level',
-            values='percentage',
-            aggfunc='sum'
-        )
-        tables['percentage'] = pivot_percentage
+        tables = {metric: pivot[metric] for metric in metrics}
         
         return tables
         
@@ -313,14 +494,25 @@ class StockDataQuery:
         Returns:
             圖表的BytesIO對象
         """
-        fig, ax1 = plt.subplots(figsize=(15, 8))
-        
         # 設定中文字體
-        plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
-        
+        matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+        
+        # K線在三張圖表間相同，只在第一次（或K線數據改變時）繪製，之後僅清除並重繪股權分佈
+        if self._chart_ax is None or self._kline_source is not kline_data:
+            fig, canvas = self._get_figure()
+            ax1 = fig.add_subplot(111)
+            # 如果有K線數據，繪製在第二個Y軸
+            if not kline_data.empty:
+                self._draw_kline(ax1, kline_data)
+            self._chart_ax = ax1
+            self._kline_source = kline_data
+        else:
+            fig, ax1 = self._figure, self._chart_ax
+            ax1.cla()
+            
         # 繪製股權分佈數據
-        colors = plt.cm.tab20(np.linspace(0, 1, len(table_data.columns)))
+        colors = colormaps['tab20'](np.linspace(0, 1, len(table_data.columns)))
         for idx, col in enumerate(table_data.columns):
             ax1.plot(table_data.index, table_data[col], 
                     label=col, color=colors[idx], linewidth=2)
@@ -331,58 +523,86 @@ class StockDataQuery:
         ax1.legend(loc='upper left', bbox_to_anchor=(1.15, 1))
         ax1.grid(True, alpha=0.3)
         
-        # 如果有K線數據，繪製在第二個Y軸
-        if not kline_data.empty:
-            ax2 = ax1.twinx()
-            
-            # 繪製K線圖
-            for idx, row in kline_data.iterrows():
-                date = mdates.date2num(row['date'])
-                open_price = row['open']
-                close_price = row['close']
-                high_price = row['high']
-                low_price = row['low']
-                
-                # 決定顏色
-                color = 'red' if close_price >= open_price else 'green'
-                
-                # 繪製K線
-                ax2.plot([date, date], [low_price, high_price], 
-                        color=color, linewidth=0.5, alpha=0.6)
-                
-                # 繪製實體
-                height = abs(close_price - open_price)
-                bottom = min(close_price, open_price)
-                rect = Rectangle((date - 0.3, bottom), 0.6, height,
-                               facecolor=color, alpha=0.6)
-                ax2.add_patch(rect)
-                
-            ax2.set_ylabel('Stock Price')
-            ax2.grid(False)
-            
-            # 添加成交量
-            ax3 = ax1.twinx()
-            ax3.spines['right'].set_position(('outward', 60))
-            ax3.bar(kline_data['date'], kline_data['volume'], 
-                   alpha=0.3, color='gray', width=0.8)
-            ax3.set_ylabel('Volume')
-            ax3.grid(False)
-            
         # 格式化X軸日期
         ax1.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
         ax1.xaxis.set_major_locator(mdates.WeekdayLocator(interval=2))
-        plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
-        
-        plt.tight_layout()
+        for label in ax1.xaxis.get_majorticklabels():
+            label.set_rotation(45)
+            
+        fig.tight_layout()
         
         # 儲存到BytesIO
         img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=100, bbox_inches='tight')
+        fig.savefig(img_buffer, format='png', dpi=100, bbox_inches='tight')
         img_buffer.seek(0)
-        plt.close()
         
         return img_buffer
         
+    def _draw_kline(self, ax1, kline_data: pd.DataFrame):
+        """
+        在ax1的第二、第三個Y軸繪製K線與成交量
+        
+        Args:
+            ax1: 股權分佈數據所在的座標軸
+            kline_data: K線數據
+        """
+        ax2 = ax1.twinx()
+        
+        # 繪製K線圖：所有影線與實體各以單一集合物件繪製，不逐根建立圖形元件
+        dates = mdates.date2num(kline_data['date'].to_numpy())
+        open_prices = kline_data['open'].to_numpy(dtype=float)
+        close_prices = kline_data['close'].to_numpy(dtype=float)
+        high_prices = kline_data['high'].to_numpy(dtype=float)
+        low_prices = kline_data['low'].to_numpy(dtype=float)
+        
+        # 決定顏色
+        colors = np.where(close_prices >= open_prices, 'red', 'green')
+        
+        # 繪製K線（影線）
+        wicks = np.stack([np.column_stack([dates, low_prices]),
+                          np.column_stack([dates, high_prices])], axis=1)
+        ax2.add_collection(LineCollection(wicks, colors=colors, linewidths=0.5, alpha=0.6))
+        
+        # 繪製實體
+        bottoms = np.minimum(open_prices, close_prices)
+        tops = np.maximum(open_prices, close_prices)
+        bodies = np.stack([np.column_stack([dates - 0.3, bottoms]),
+                           np.column_stack([dates + 0.3, bottoms]),
+                           np.column_stack([dates + 0.3, tops]),
+                           np.column_stack([dates - 0.3, tops])], axis=1)
+        ax2.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors='none', alpha=0.6))
+        ax2.autoscale_view()
+        # K線在三張圖表間不變，固定座標範圍，之後重繪時不再重新計算
+        ax2.set_ylim(ax2.get_ylim())
+        ax2.set_autoscaley_on(False)
+        
+        ax2.set_ylabel('Stock Price')
+        ax2.grid(False)
+        
+        # 添加成交量
+        ax3 = ax1.twinx()
+        ax3.spines['right'].set_position(('outward', 60))
+        ax3.bar(kline_data['date'], kline_data['volume'], 
+               alpha=0.3, color='gray', width=0.8)
+        ax3.set_ylim(ax3.get_ylim())
+        ax3.set_autoscaley_on(False)
+        ax3.set_ylabel('Volume')
+        ax3.grid(False)
+        
+    def _get_figure(self) -> Tuple[Figure, FigureCanvasAgg]:
+        """
+        取得共用的Figure與畫布，首次呼叫時建立，之後清除重用
+        
+        Returns:
+            (Figure, FigureCanvasAgg)
+        """
+        if self._figure is None:
+            self._figure = Figure(figsize=(15, 8))
+            self._canvas = FigureCanvasAgg(self._figure)
+        else:
+            self._figure.clf()
+        return self._figure, self._canvas
+        
     def export_to_excel(self, stock_code: str, tables: Dict[str, pd.DataFrame],
                        kline_data: pd.DataFrame, output_file: str):
         """
@@ -394,34 +614,24 @@ class StockDataQuery:
             kline_data: K線數據
             output_file: 輸出檔案名稱
         """
-        wb = Workbook()
-        
-        # 移除預設的工作表
-        wb.remove(wb.active)
+        # 使用 write-only 模式，逐列串流寫入以降低記憶體與CPU開銷
+        wb = Workbook(write_only=True)
         
         # 建立三個工作表
-        sheet_configs = [
-            ('人數', 'holders', 'Holders Distribution'),
-            ('股數', 'shares', 'Shares Distribution'),
-            ('占比', 'percentage', 'Percentage Distribution')
-        ]
-        
-        for sheet_name, table_key, chart_title in sheet_configs:
+        for sheet_name, table_key, chart_title in SHEET_CONFIGS:
             ws = wb.create_sheet(title=sheet_name)
             
             # 寫入表格數據
             table_data = tables[table_key]
             
             # 寫入標題
-            ws.cell(row=1, column=1, value='日期')
-            for col_idx, col_name in enumerate(table_data.columns, 2):
-                ws.cell(row=1, column=col_idx, value=col_name)
+            ws.append(['日期', *table_data.columns])
                 
-            # 寫入數據
-            for row_idx, (date, row_data) in enumerate(table_data.iterrows(), 2):
-                ws.cell(row=row_idx, column=1, value=date.strftime('%Y-%m-%d'))
-                for col_idx, value in enumerate(row_data, 2):
-                    ws.cell(row=row_idx, column=col_idx, value=value)
+            # 寫入數據（整個表格一次轉為列清單，NaN 輸出為空白儲存格）
+            dates = table_data.index.strftime('%Y-%m-%d')
+            rows = table_data.astype(object).where(table_data.notna(), None).to_numpy().tolist()
+            for date_str, row_values in zip(dates, rows):
+                ws.append([date_str, *row_values])
                     
             # 建立圖表並插入
             img_buffer = self.create_chart_with_kline(
@@ -439,35 +649,54 @@ class StockDataQuery:
         wb.save(output_file)
         logger.info(f"已輸出到 {output_file}")
         
-    def run(self, stock_code: str, start_date: str, end_date: str, output_file: Optional[str] = None):
+    def export_feather(self, tables: Dict[str, pd.DataFrame], output_file: str):
+        """
+        將三個表格另存為Feather中繼檔，供程式三快速讀取
+        
+        Args:
+            tables: 三個表格的字典
+            output_file: Excel輸出檔案名稱（中繼檔以其檔名為前綴）
+        """
+        base = Path(output_file)
+        for sheet_name, table_key, _ in SHEET_CONFIGS:
+            feather_file = base.with_name(f"{base.stem}_{sheet_name}.feather")
+            tables[table_key].rename_axis(index='date', columns=None).reset_index().to_feather(feather_file)
+        logger.info(f"已輸出Feather中繼檔到 {base.parent}")
+        
+    def run(self, stock_code: str, start_date: Union[str, datetime], end_date: Union[str, datetime],
+            output_file: Optional[str] = None):
         """
         執行查詢與整理
         
         Args:
             stock_code: 股票代碼
-            start_date: 起始日期 (YYYY-MM-DD)
-            end_date: 結束日期 (YYYY-MM-DD)
+            start_date: 起始日期 (YYYY-MM-DD字串或datetime)
+            end_date: 結束日期 (YYYY-MM-DD字串或datetime)
             output_file: 輸出檔案名稱
         """
-        logger.info(f"開始查詢股票 {stock_code} 從 {start_date} 到 {end_date}")
+        # 日期只解析一次，之後直接傳遞datetime
+        start_dt, end_dt = _as_datetime(start_date), _as_datetime(end_date)
+        start_str, end_str = f"{start_dt:%Y-%m-%d}", f"{end_dt:%Y-%m-%d}"
+        logger.info(f"開始查詢股票 {stock_code} 從 {start_str} 到 {end_str}")
         
         # 載入股權分佈數據
-        distribution_data = self.load_stock_data(stock_code, start_date, end_date)
+        distribution_data = self.load_stock_data(stock_code, start_dt, end_dt)
         if distribution_data.empty:
             logger.error("無法載入股權分佈數據")
             return
             
         # 獲取K線數據
-        kline_data = self.fetch_kline_data(stock_code, start_date, end_date)
+        kline_data = self.fetch_kline_data(stock_code, start_dt, end_dt)
         
         # 建立表格
         tables = self.create_tables(distribution_data)
         
         # 輸出到Excel
         if not output_file:
-            output_file = f"{stock_code}_{start_date}_{end_date}_analysis.xlsx"
+            output_file = f"{stock_code}_{start_str}_{end_str}_analysis.xlsx"
             
         self.export_to_excel(stock_code, tables, kline_data, output_file)
+        self.export_feather(tables, output_file)
         
 def main():
     """主程序"""
@@ -480,17 +709,17 @@ def main():
     
     args = parser.parse_args()
     
-    # 驗證日期格式
+    # 驗證日期格式（解析結果直接傳給查詢，不再重複解析）
     try:
-        datetime.strptime(args.start_date, '%Y-%m-%d')
-        datetime.strptime(args.end_date, '%Y-%m-%d')
+        start_dt = datetime.strptime(args.start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(args.end_date, '%Y-%m-%d')
     except ValueError:
         logger.error("日期格式錯誤，請使用 YYYY-MM-DD 格式")
         return
         
     # 執行查詢
     query = StockDataQuery(data_dir=args.data_dir)
-    query.run(args.stock_code, args.start_date, args.end_date, args.output)
+    query.run(args.stock_code, start_dt, end_dt, args.output)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,8 +6,8 @@
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib import colormaps
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 import openpyxl
@@ -15,6 +15,7 @@ from openpyxl import Workbook, load_workbook
 from openpyxl.drawing.image import Image
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
+from functools import lru_cache
 import logging
 import argparse
 from io import BytesIO
@@ -28,6 +29,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 程式二輸出的三個工作表名稱
+METRIC_SHEETS = ['人數', '股數', '占比']
+
+# 同一組級距標籤會在各分類與各指標間重複解析，快取解析結果
+@lru_cache(maxsize=256)
+def _parse_level_range(level: str) -> Tuple[int, int]:
+    """
+    解析持股級距字串（結果快取）
+    
+    Args:
+        level: 持股級距字串 (例如: "1,000-5,000")
+        
+    Returns:
+        (最小值, 最大值)
+    """
+    try:
+        # 移除逗號和空格
+        level = level.replace(',', '').replace(' ', '')
+        
+        if '以上' in level or '以上' in level:
+            # 處理 "1,000,001以上" 這種格式
+            min_val = int(level.replace('以上', '').replace('以上', ''))
+            return min_val, float('inf')
+        elif '-' in level:
+            # 處理 "1,000-5,000" 這種格式
+            parts = level.split('-')
+            return int(parts[0]), int(parts[1])
+        else:
+            # 單一數值
+            val = int(level)
+            return val, val
+    except:
+        logger.warning(f"無法解析級距: {level}")
+        return 0, 0
+
 class StockAnalysisVisualizer:
     """股權分佈數據分析與視覺化系統"""
     
@@ -52,6 +88,10 @@ class StockAnalysisVisualizer:
             '1,000,001以上'
         ]
         
+        # 所有趨勢圖共用同一個Figure，避免每張圖重新配置畫布
+        self._figure = None
+        self._canvas = None
+        
     def load_excel_data(self, excel_file: str) -> Dict[str, pd.DataFrame]:
         """
         載入程式二輸出的Excel檔案
@@ -63,16 +103,18 @@ class StockAnalysisVisualizer:
             包含三個表格數據的字典
         """
         try:
-            # 讀取Excel檔案的所有工作表
-            excel_data = pd.read_excel(excel_file, sheet_name=None, engine='openpyxl')
+            # 優先讀取程式二輸出的Feather中繼檔
+            result = self.load_feather_data(excel_file)
+            if result:
+                logger.info(f"成功從Feather中繼檔載入 {len(result)} 個表格")
+                return result
+                
+            # 只讀取程式二輸出的三個指標工作表，第一欄（日期）直接解析為索引
+            with pd.ExcelFile(excel_file, engine='openpyxl') as excel:
+                sheets = [name for name in METRIC_SHEETS if name in excel.sheet_names]
+                excel_data = excel.parse(sheet_name=sheets, index_col=0, parse_dates=True)
             
-            result = {}
-            for sheet_name, df in excel_data.items():
-                # 設定第一欄為索引（日期）
-                if not df.empty:
-                    df.set_index(df.columns[0], inplace=True)
-                    df.index = pd.to_datetime(df.index)
-                    result[sheet_name] = df
+            result = {sheet_name: df for sheet_name, df in excel_data.items() if not df.empty}
                     
             logger.info(f"成功載入 {len(result)} 個工作表")
             return result
@@ -81,6 +123,29 @@ class StockAnalysisVisualizer:
             logger.error(f"載入Excel檔案失敗: {e}")
             return {}
             
+    def load_feather_data(self, excel_file: str) -> Dict[str, pd.DataFrame]:
+        """
+        載入程式二與Excel一併輸出的Feather中繼檔
+        
+        Args:
+            excel_file: Excel檔案路徑
+            
+        Returns:
+            包含三個表格數據的字典；中繼檔不存在或比Excel舊時回傳空字典
+        """
+        base = Path(excel_file)
+        excel_mtime = base.stat().st_mtime if base.exists() else 0
+        
+        result = {}
+        for sheet_name in METRIC_SHEETS:
+            feather_file = base.with_name(f"{base.stem}_{sheet_name}.feather")
+            # Excel在中繼檔之後被修改過時，以Excel為準
+            if not feather_file.exists() or feather_file.stat().st_mtime < excel_mtime:
+                return {}
+            result[sheet_name] = pd.read_feather(feather_file).set_index('date')
+            
+        return result
+        
     def parse_level_range(self, level: str) -> Tuple[int, int]:
         """
         解析持股級距字串
@@ -91,25 +156,7 @@ class StockAnalysisVisualizer:
         Returns:
             (最小值, 最大值)
         """
-        try:
-            # 移除逗號和空格
-            level = level.replace(',', '').replace(' ', '')
-            
-            if '以上' in level or '以上' in level:
-                # 處理 "1,000,001以上" 這種格式
-                min_val = int(level.replace('以上', '').replace('以上', ''))
-                return min_val, float('inf')
-            elif '-' in level:
-                # 處理 "1,000-5,000" 這種格式
-                parts = level.split('-')
-                return int(parts[0]), int(parts[1])
-            else:
-                # 單一數值
-                val = int(level)
-                return val, val
-        except:
-            logger.warning(f"無法解析級距: {level}")
-            return 0, 0
+        return _parse_level_range(level)
             
     def categorize_by_shares(self, levels: List[str]) -> Dict[str, List[str]]:
         """
@@ -191,19 +238,20 @@ class StockAnalysisVisualizer:
         Returns:
             分類後的級距字典
         """
+        # 每個級距只解析一次，轉為最小值/最大值陣列
+        bounds = np.array([self.parse_level_range(level) for level in levels], dtype=float).reshape(-1, 2)
+        min_vals, max_vals = bounds[:, 0], bounds[:, 1]
+        level_array = np.array(levels, dtype=object)
+        
         categories = {}
-        for i, (range_min, range_max) in enumerate(custom_ranges):
+        for range_min, range_max in custom_ranges:
             category_name = f"{range_min:,}-{range_max:,}" if range_max != float('inf') else f"{range_min:,}以上"
-            categories[category_name] = []
             
-            for level in levels:
-                min_val, max_val = self.parse_level_range(level)
-                
-                # 檢查級距是否在範圍內
-                if (min_val >= range_min and min_val <= range_max) or \
-                   (max_val >= range_min and max_val <= range_max) or \
-                   (min_val <= range_min and max_val >= range_max):
-                    categories[category_name].append(level)
+            # 檢查級距是否在範圍內（一次比對所有級距）
+            in_range = (((min_vals >= range_min) & (min_vals <= range_max)) |
+                        ((max_vals >= range_min) & (max_vals <= range_max)) |
+                        ((min_vals <= range_min) & (max_vals >= range_max)))
+            categories[category_name] = level_array[in_range].tolist()
                     
         return categories
         
@@ -243,13 +291,12 @@ class StockAnalysisVisualizer:
         Returns:
             圖表的BytesIO對象
         """
-        # 建立圖表
-        fig = Figure(figsize=(16, 10))
-        canvas = FigureCanvasAgg(fig)
+        # 取得共用圖表並清除上一張圖的內容
+        fig, canvas = self._get_figure()
         ax = fig.add_subplot(111)
         
         # 設定顏色
-        colors = plt.cm.tab20(np.linspace(0, 1, len(df.columns)))
+        colors = colormaps['tab20'](np.linspace(0, 1, len(df.columns)))
         
         # 繪製每條線
         for idx, col in enumerate(df.columns):
@@ -271,22 +318,24 @@ class StockAnalysisVisualizer:
         # 動態刻度處理
         if use_dynamic_scale and len(df) > 3:
             for col in df.columns:
-                col_data = df[col].dropna()
-                if len(col_data) >= 3:
-                    # 檢查連續3個數據點的變化範圍
-                    for i in range(len(col_data) - 2):
-                        window = col_data.iloc[i:i+3]
-                        y_range = window.max() - window.min()
-                        total_range = col_data.max() - col_data.min()
-                        
-                        # 如果變化範圍小於總範圍的1%，調整Y軸刻度
-                        if total_range > 0 and y_range / total_range < 0.01:
-                            # 設定更細緻的Y軸範圍
-                            y_min = col_data.min() * 0.95
-                            y_max = col_data.max() * 1.05
-                            ax.set_ylim(y_min, y_max)
-                            logger.info(f"為 {col} 調整Y軸刻度以顯示細微變化")
-                            break
+                col_data = df[col].dropna().to_numpy(dtype=float)
+                if len(col_data) < 3:
+                    continue
+                    
+                col_min, col_max = col_data.min(), col_data.max()
+                total_range = col_max - col_min
+                if total_range <= 0:
+                    continue
+                    
+                # 一次計算所有連續3個數據點的變化範圍
+                windows = np.lib.stride_tricks.sliding_window_view(col_data, 3)
+                window_ranges = windows.max(axis=1) - windows.min(axis=1)
+                
+                # 如果變化範圍小於總範圍的1%，調整Y軸刻度
+                if (window_ranges < total_range * 0.01).any():
+                    # 設定更細緻的Y軸範圍
+                    ax.set_ylim(col_min * 0.95, col_max * 1.05)
+                    logger.info(f"為 {col} 調整Y軸刻度以顯示細微變化")
                             
         # 添加網格
         ax.grid(True, alpha=0.3, linestyle='--')
@@ -314,6 +363,20 @@ class StockAnalysisVisualizer:
         
         return img_buffer
         
+    def _get_figure(self) -> Tuple[Figure, FigureCanvasAgg]:
+        """
+        取得共用的Figure與畫布，首次呼叫時建立，之後清除重用
+        
+        Returns:
+            (Figure, FigureCanvasAgg)
+        """
+        if self._figure is None:
+            self._figure = Figure(figsize=(16, 10))
+            self._canvas = FigureCanvasAgg(self._figure)
+        else:
+            self._figure.clf()
+        return self._figure, self._canvas
+        
     def export_analysis(self, data: Dict[str, pd.DataFrame], categories: Dict[str, List[str]],
                        category_name: str, output_prefix: str):
         """
@@ -337,10 +400,9 @@ class StockAnalysisVisualizer:
                 logger.warning(f"找不到 {sheet_name} 工作表，跳過")
                 continue
                 
-            # 建立新的工作簿
-            wb = Workbook()
-            ws = wb.active
-            ws.title = f"{category_name}_{metric_label}"
+            # 建立新的工作簿（write-only 模式，逐列串流寫入）
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet(title=f"{category_name}_{metric_label}")
             
             # 聚合數據
             df = data[sheet_name]
@@ -352,15 +414,13 @@ class StockAnalysisVisualizer:
                 
             # 寫入數據到工作表
             # 寫入標題
-            ws.cell(row=1, column=1, value='日期')
-            for col_idx, col_name in enumerate(aggregated_df.columns, 2):
-                ws.cell(row=1, column=col_idx, value=col_name)
+            ws.append(['日期', *aggregated_df.columns])
                 
-            # 寫入數據
-            for row_idx, (date, row_data) in enumerate(aggregated_df.iterrows(), 2):
-                ws.cell(row=row_idx, column=1, value=date.strftime('%Y-%m-%d'))
-                for col_idx, value in enumerate(row_data, 2):
-                    ws.cell(row=row_idx, column=col_idx, value=value)
+            # 寫入數據（整個表格一次轉為列清單，NaN 輸出為空白儲存格）
+            dates = aggregated_df.index.strftime('%Y-%m-%d')
+            rows = aggregated_df.astype(object).where(aggregated_df.notna(), None).to_numpy().tolist()
+            for date_str, row_values in zip(dates, rows):
+                ws.append([date_str, *row_values])
                     
             # 建立趨勢圖
             chart_title = f"{category_name} - {metric_label}趨勢圖"